@@ -0,0 +1,32 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURATION ---
+CACHE_DIR = 'cache'
+DB_PATH = os.path.join(CACHE_DIR, 'responses.db')
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# One connection shared by all worker threads; WAL keeps readers off the writer's lock
+_conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.execute("CREATE TABLE IF NOT EXISTS cache (prompt_hash TEXT PRIMARY KEY, response TEXT, ts INTEGER)")
+_lock = threading.Lock()
+
+def prompt_key(prompt):
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+
+def get(prompt):
+    with _lock:
+        row = _conn.execute("SELECT response FROM cache WHERE prompt_hash=?", (prompt_key(prompt),)).fetchone()
+    return row[0] if row else None
+
+def put(prompt, response):
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO cache (prompt_hash, response, ts) VALUES (?, ?, ?)",
+            (prompt_key(prompt), response, int(time.time())),
+        )
@@ -1,24 +1,87 @@
-import json
 import os
 import re
+import string
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+import orjson
 from datetime import date
 
+import cache
+import semantic_cache
+
 # --- CONFIGURATION ---
 GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
 JSON_PATH = 'data/questions.json'
+# Append-only record of posts written since the JSON was last saved
+PUBLISHED_LOG_PATH = 'data/published.ndjson'
 POSTS_DIR = '_posts'
+# Read the clock once so a run spanning midnight stays on one date
+_TODAY = date.today()
+_TODAY_STR = _TODAY.strftime("%Y-%m-%d")
+# Weekend = 8 posts, Weekday = 4 posts
+_TARGET = 8 if _TODAY.weekday() >= 5 else 4
+MAX_WORKERS = 8
+# Questions sent to Gemini per request
+BATCH_SIZE = 4
+# Large enough that a whole post goes out in one write(2)
+WRITE_BUFFER_SIZE = 65536
+# Quota of the API key's tier (defaults are the free tier for gemini-2.5-flash)
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", 10))
+GEMINI_TPM = int(os.environ.get("GEMINI_TPM", 250000))
+EST_OUTPUT_TOKENS = 4096
+
+genai.configure(api_key=GEMINI_API_KEY, transport='grpc')
+# Build the shared client up front; models create it lazily on first call, so
+# concurrent workers would otherwise race to open their own channels. One gRPC
+# channel is thread-safe and multiplexes every request over a single HTTP/2 connection.
+genai_client.get_default_generative_client()
+
+class RateLimiter:
+    """Token bucket that paces calls to stay under the RPM/TPM quota instead of hitting 429s."""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.available_request_capacity = float(rpm)
+        self.available_token_capacity = float(tpm)
+        self.last_update = time.monotonic()
+        self.condition = threading.Condition()
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+    def _has_capacity(self, tokens):
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.available_request_capacity = min(self.rpm, self.available_request_capacity + elapsed * self.rpm / 60)
+        self.available_token_capacity = min(self.tpm, self.available_token_capacity + elapsed * self.tpm / 60)
+        return self.available_request_capacity >= 1 and self.available_token_capacity >= tokens
+
+    def acquire(self, tokens):
+        tokens = min(tokens, self.tpm)
+        with self.condition:
+            # Capacity refills with time rather than on notify, so poll
+            while not self.condition.wait_for(lambda: self._has_capacity(tokens), timeout=0.5):
+                pass
+            self.available_request_capacity -= 1
+            self.available_token_capacity -= tokens
+
+rate_limiter = RateLimiter(GEMINI_RPM, GEMINI_TPM)
+
+_FILENAME_RE = re.compile(r'[^a-zA-Z0-9\s-]')
+_FENCE_RE = re.compile(r'```(?:markdown)?')
+_DATE_RE = re.compile(r'^date: .*$', re.M)
 
 def clean_filename(text):
-    return re.sub(r'[^a-zA-Z0-9\s-]', '', text).strip().replace(' ', '-').lower()[:50]
+    return _FILENAME_RE.sub('', text).strip().replace(' ', '-').lower()[:50]
 
-def generate_blog_post(question_text):
-    prompt = f"""
-    You are a Principal Software Engineer writing a technical blog post. 
-    The Topic is: "{question_text}"
+# Identical for every post, so it goes in the system instruction and only the
+# short per-question tail below changes between requests (a stable, cacheable prefix)
+_SYSTEM_INSTRUCTIONS = """
+    You are a Principal Software Engineer writing a technical blog post.
+    Each message gives the Topic and the Date of the post.
     
     **DESIGN INSTRUCTIONS (Strictly Follow):**
     1. **Layout:** Use proper Markdown headers (##, ###) to structure the article.
@@ -36,8 +99,8 @@ def generate_blog_post(question_text):
 
     **Output Structure:**
     ---
-    title: "{question_text}"
-    date: {date.today().strftime("%Y-%m-%d")}
+    title: "<Topic>"
+    date: <Date>
     categories: [System Design, Concepts]
     tags: [interview, architecture, learning]
     toc: true
@@ -56,56 +119,317 @@ def generate_blog_post(question_text):
     ## 4. Real-World Use Case
     (Where is this used? e.g., Netflix, Uber. Explain the "Why".)
     """
-    
+
+_PROMPT_TEMPLATE = string.Template('Topic: "$q"\nDate: $today')
+
+_BATCH_PROMPT_TEMPLATE = string.Template(
+    'Write one post for each of the $k Topics below. Date: $today\n'
+    'Return a JSON array of length $k where element i is {"markdown": <the post for Topic i>}.\n'
+    '$topics'
+)
+
+class _Post(typing.TypedDict):
+    markdown: str
+
+_BATCH_GENERATION_CONFIG = {'response_mime_type': 'application/json', 'response_schema': list[_Post]}
+
+model = genai.GenerativeModel('gemini-2.5-flash', system_instruction=_SYSTEM_INSTRUCTIONS)
+
+class _FenceStripper:
+    """Streaming version of `_FENCE_RE.sub('', text).strip()`.
+
+    Only a tail that could still grow into a fence (plus trailing whitespace)
+    is held back between chunks.
+    """
+
+    _FENCE = '```markdown'
+
+    def __init__(self):
+        self._pending = ''
+        self._started = False
+
+    def _emit(self, text):
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, chunk):
+        text = self._pending + chunk
+        cut = len(text)
+        for i in range(max(0, len(text) - len(self._FENCE) + 1), len(text)):
+            if self._FENCE.startswith(text[i:]):
+                cut = i
+                break
+        # Never split a run of backticks, or the fence could be matched at the wrong offset
+        while cut and text[cut - 1] == '`':
+            cut -= 1
+        out = _FENCE_RE.sub('', text[:cut])
+        body = out.rstrip()
+        self._pending = out[len(body):] + text[cut:]
+        return self._emit(body)
+
+    def close(self):
+        out = self._emit(_FENCE_RE.sub('', self._pending).rstrip())
+        self._pending = ''
+        return out
+
+def write_post(path, text):
+    # Write beside the target and swap it in, so a kill never leaves a partial post
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(_FENCE_RE.sub('', text).strip().encode('utf-8'))
+    os.replace(tmp_path, path)
+    return True
+
+def _prompt_and_key(question_text):
+    prompt = _PROMPT_TEMPLATE.substitute(q=question_text, today=_TODAY_STR)
+    # Leave the date out of the key so a later day's run still hits; _redate fixes it up
+    return prompt, _SYSTEM_INSTRUCTIONS + question_text
+
+def _redate(text):
+    return _DATE_RE.sub(f"date: {_TODAY_STR}", text, count=1)
+
+def _remember(question_text, text):
+    # Caching is best-effort; the post is already on disk
+    try:
+        cache.put(_prompt_and_key(question_text)[1], text)
+    except Exception as e:
+        print(f"Cache Error: {e}")
+    # The semantic layer is optional; losing an entry must not fail the post
+    try:
+        semantic_cache.add(question_text, text)
+    except Exception as e:
+        print(f"Semantic Cache Error: {e}")
+
+def cached_post(question_text):
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        cached = cache.get(_prompt_and_key(question_text)[1])
+    except Exception as e:
+        print(f"Cache Error: {e}")
+        cached = None
+    if cached is None:
+        try:
+            cached = semantic_cache.lookup(question_text)
+        except Exception as e:
+            print(f"Semantic Cache Error: {e}")
+    # Cached posts may come from an earlier day
+    return None if cached is None else _redate(cached)
+
+def generate_blog_post(question_text, path):
+    """Write the post for question_text to path, returning whether it was written."""
+    cached = cached_post(question_text)
+    if cached is not None:
+        try:
+            return write_post(path, cached)
+        except OSError as e:
+            print(f"Write Error: {e}")
+            return False
+
+    prompt, cache_key = _prompt_and_key(question_text)
+    # Stream into a temp file so a failure mid-generation never leaves a partial post
+    tmp_path = path + '.part'
+    try:
+        rate_limiter.acquire(len(cache_key) // 4 + EST_OUTPUT_TOKENS)
+        response = model.generate_content(prompt, stream=True)
+        chunks = []
+        stripper = _FenceStripper()
+        with open(tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            for chunk in response:
+                if not chunk.parts:
+                    continue
+                chunks.append(chunk.text)
+                f.write(stripper.feed(chunk.text))
+            f.write(stripper.close())
+
+        text = ''.join(chunks)
+        if not text:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, path)
     except Exception as e:
         print(f"Gemini Error: {e}")
-        return None
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    _remember(question_text, text)
+    return True
+
+def generate_blog_batch(items):
+    """Write posts for (question_text, path) pairs with one Gemini call for all cache misses.
+
+    Returns a list of booleans, one per item, saying whether its post was written.
+    """
+    results = [False] * len(items)
+    misses = []
+    for i, (question_text, path) in enumerate(items):
+        cached = cached_post(question_text)
+        if cached is None:
+            misses.append(i)
+            continue
+        try:
+            results[i] = write_post(path, cached)
+        except OSError as e:
+            print(f"Write Error: {e}")
+
+    # A lone miss gains nothing from batching, so keep it on the streaming path
+    if len(misses) == 1:
+        i = misses[0]
+        results[i] = generate_blog_post(*items[i])
+        return results
+    if not misses:
+        return results
+
+    topics = "\n".join(f'{n}. "{items[i][0]}"' for n, i in enumerate(misses, 1))
+    prompt = _BATCH_PROMPT_TEMPLATE.substitute(k=len(misses), topics=topics, today=_TODAY_STR)
+    try:
+        rate_limiter.acquire(len(_SYSTEM_INSTRUCTIONS + prompt) // 4 + EST_OUTPUT_TOKENS * len(misses))
+        response = model.generate_content(prompt, generation_config=_BATCH_GENERATION_CONFIG)
+        posts = orjson.loads(response.text)
+        if not isinstance(posts, list) or len(posts) != len(misses):
+            raise ValueError(f"expected a list of {len(misses)} posts")
+    except Exception as e:
+        print(f"Gemini Error: {e}; retrying the batch one post at a time")
+        posts = [None] * len(misses)
+
+    for i, post in zip(misses, posts):
+        question_text, path = items[i]
+        # A missing or malformed element falls back to its own request, as before batching
+        if not (isinstance(post, dict) and isinstance(post.get('markdown'), str) and post['markdown']):
+            if post is not None:
+                print(f"Malformed post for {question_text[:30]}..., retrying alone")
+            results[i] = generate_blog_post(question_text, path)
+            continue
+        try:
+            results[i] = write_post(path, post['markdown'])
+        except OSError as e:
+            print(f"Write Error: {e}")
+            continue
+        _remember(question_text, post['markdown'])
+    return results
+
+def post_title(path):
+    """Return the front-matter title of an existing post, or None."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.readline().strip() != '---':
+                return None
+            for line in f:
+                if line.strip() == '---':
+                    break
+                if line.startswith('title:'):
+                    return line[len('title:'):].strip().strip('"').replace('\\"', '"')
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+def load_published_log():
+    published = set()
+    if os.path.exists(PUBLISHED_LOG_PATH):
+        with open(PUBLISHED_LOG_PATH, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    published.add(orjson.loads(line)['q'])
+                except (orjson.JSONDecodeError, KeyError, TypeError):
+                    # Torn line from a process killed mid-append; that post was never logged
+                    print(f"Skipping unreadable log line: {line[:60]!r}")
+    return published
 
 def main():
     if not os.path.exists(POSTS_DIR):
         os.makedirs(POSTS_DIR)
 
-    # Weekend = 8 posts, Weekday = 4 posts
-    target_count = 8 if date.today().weekday() >= 5 else 4
-    print(f"Target: {target_count}")
+    print(f"Target: {_TARGET}")
     
     if not os.path.exists(JSON_PATH):
         print("No JSON file found.")
         return
 
-    with open(JSON_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(JSON_PATH, 'rb') as f:
+        data = orjson.loads(f.read())
 
-    processed_count = 0
+    # Recover statuses from a run that died before saving the JSON
+    published = load_published_log()
+    for entry in data:
+        if entry['Question'] in published:
+            entry['Status'] = 'Published'
 
+    # Posts by slug (after the "YYYY-MM-DD-" prefix), as a crashed run may be from an earlier day
+    posts_by_slug = {}
+    for name in os.listdir(POSTS_DIR):
+        posts_by_slug.setdefault(name[11:], []).append(name)
+    taken = set(os.listdir(POSTS_DIR))
+
+    pending = []
     for entry in data:
-        if processed_count >= target_count: break
-        
-        # Skip if already published
+        if len(pending) >= _TARGET: break
         if entry.get('Status') == 'Published': continue
-            
-        print(f"Processing: {entry['Question'][:30]}...")
-        
-        content = generate_blog_post(entry['Question'])
-        
-        if content:
-            # Cleanup markdown wrapper if present
-            content = content.replace("```markdown", "").replace("```", "").strip()
-            
-            filename = f"{date.today()}-{clean_filename(entry['Question'])}.md"
-            with open(os.path.join(POSTS_DIR, filename), 'w', encoding='utf-8') as f:
-                f.write(content)
-                
+
+        slug = f"{clean_filename(entry['Question'])}.md"
+        # Post was written but its status never saved, so don't pay for it again.
+        # Slugs are truncated, so only trust a match whose title is this question.
+        if any(post_title(os.path.join(POSTS_DIR, name)) == entry['Question']
+               for name in posts_by_slug.get(slug, [])):
             entry['Status'] = 'Published'
-            processed_count += 1
+            continue
+
+        filename = f"{_TODAY_STR}-{slug}"
+        # Another question already owns this file (on disk or earlier in this run)
+        if filename in taken:
+            print(f"Skipping (filename clash): {entry['Question'][:30]}...")
+            continue
+        taken.add(filename)
+        pending.append((entry, filename))
+
+    processed_count = 0
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+
+    if batches:
+        # Batches are independent and API-bound, so generate them concurrently
+        with open(PUBLISHED_LOG_PATH, 'ab') as append_log, \
+                ThreadPoolExecutor(max_workers=min(len(batches), MAX_WORKERS)) as executor:
+            futures = {}
+            for batch in batches:
+                items = []
+                for entry, filename in batch:
+                    print(f"Processing: {entry['Question'][:30]}...")
+                    items.append((entry['Question'], os.path.join(POSTS_DIR, filename)))
+                futures[executor.submit(generate_blog_batch, items)] = batch
+
+            for future in as_completed(futures):
+                # One failed batch must not stop the others' statuses being saved
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Batch Error: {e}")
+                    continue
+
+                for (entry, _), written in zip(futures[future], results):
+                    if not written:
+                        continue
+
+                    # Only this (main) thread touches statuses and the log
+                    append_log.write(orjson.dumps({"q": entry['Question']}) + b"\n")
+                    append_log.flush()
+                    os.fsync(append_log.fileno())
+                    entry['Status'] = 'Published'
+                    processed_count += 1
+
+    # Save JSON durably through a temp file, so a crash can't leave it half-written
+    with open(JSON_PATH + '.tmp', 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(JSON_PATH + '.tmp', JSON_PATH)
+
+    # The JSON now holds every status, so the log can be compacted away
+    if os.path.exists(PUBLISHED_LOG_PATH):
+        os.remove(PUBLISHED_LOG_PATH)
 
-    # Save JSON
-    with open(JSON_PATH, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
-    
     print(f"Done. Generated {processed_count} posts.")
 
 if __name__ == "__main__":
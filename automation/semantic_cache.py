@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+
+import cache
+
+# Optional: without these installed every lookup is a miss
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except Exception:  # missing, or a broken torch install
+    np = None
+    SentenceTransformer = None
+
+# --- CONFIGURATION ---
+EMBS_PATH = os.path.join(cache.CACHE_DIR, 'embs.npy')
+META_PATH = os.path.join(cache.CACHE_DIR, 'meta.json')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+THRESHOLD = 0.92
+
+_lock = threading.Lock()
+_loaded = False
+_encoder = None
+_embs = None
+_meta = []  # (question, response) pairs, parallel to the rows of _embs
+
+def _load():
+    """Load the model and cache files once; any failure leaves the layer disabled."""
+    global _loaded, _encoder, _embs, _meta
+    if _loaded:
+        return
+    _loaded = True
+    if SentenceTransformer is None:
+        return
+
+    try:
+        encoder = SentenceTransformer(MODEL_NAME)
+        embs = None
+        meta = []
+        if os.path.exists(EMBS_PATH) and os.path.exists(META_PATH):
+            embs = np.load(EMBS_PATH)
+            with open(META_PATH, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            # A crash between the two file swaps leaves them out of step; start over
+            if len(meta) != embs.shape[0]:
+                print("Semantic cache files disagree, discarding them.")
+                embs = None
+                meta = []
+        if embs is None:
+            embs = np.empty((0, encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+    except Exception as e:
+        print(f"Semantic cache disabled: {e}")
+        return
+    _encoder, _embs, _meta = encoder, embs, meta
+
+def _encode(text):
+    return _encoder.encode(text, normalize_embeddings=True).astype(np.float32)
+
+def lookup(question_text):
+    """Return a cached post for a near-duplicate question, retitled for this one."""
+    with _lock:
+        _load()
+        if _encoder is None or not _meta:
+            return None
+        emb = _encode(question_text)
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        scores = _embs @ emb
+        best = int(scores.argmax())
+        if scores[best] < THRESHOLD:
+            return None
+        cached_question, response = _meta[best]
+
+    print(f"Semantic cache hit ({scores[best]:.2f}): {cached_question[:30]}...")
+    return response.replace(cached_question, question_text)
+
+def add(question_text, response):
+    global _embs
+    with _lock:
+        _load()
+        if _encoder is None:
+            return
+        _embs = np.vstack([_embs, _encode(question_text)])
+        _meta.append((question_text, response))
+        # Write to temp files and swap them in, so a crash never leaves a torn file
+        with open(EMBS_PATH + '.tmp', 'wb') as f:
+            np.save(f, _embs)
+        with open(META_PATH + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(_meta, f)
+        os.replace(EMBS_PATH + '.tmp', EMBS_PATH)
+        os.replace(META_PATH + '.tmp', META_PATH)